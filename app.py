@@ -1,11 +1,32 @@
 import os
+import time
+import json
+import re
+import html
+import hashlib
+import threading
 import streamlit as st
 from datetime import datetime
 import sqlite3
+import numpy as np
 from dotenv import load_dotenv
-from groq import Groq
-import requests, logging
-from cryptography.fernet import Fernet
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import hyperscan
+except Exception:
+    hyperscan = None
+
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
+try:
+    import orjson
+except Exception:
+    orjson = None
 
 # ==============================
 # Setup
@@ -18,35 +39,140 @@ DEEPGRAM_KEY = os.getenv("DEEPGRAM_API_KEY")
 FERNET_KEY = os.getenv("FERNET_KEY")
 GROQ_KEY = os.getenv("GROQ_API_KEY")
 DB_PATH = os.getenv("LOCAL_DB_PATH", "journal_data.db")
+GROQ_CACHE_TTL = int(os.getenv("GROQ_CACHE_TTL", "86400"))  # seconds
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.90"))  # cosine similarity
+SEMANTIC_CACHE_TTL = 7 * 86400  # seconds; keeps reused reflections reasonably fresh
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+GROQ_MODEL = "llama3-8b-8192"
+# With FERNET_KEY set, LLM outputs must not reach the DB in plaintext, so the Groq
+# response cache and the semantic cache are switched off.
+CACHE_LLM_OUTPUTS = not FERNET_KEY
+
+# API clients are created on first use: groq (httpx + pydantic), cryptography and
+# requests are only imported when a code path actually needs them.
+
+# One Groq client per server process. With the optional h2 package installed,
+# concurrent Groq requests are multiplexed over a single HTTP/2 connection.
+@st.cache_resource(show_spinner=False)
+def get_groq_client():
+    if not GROQ_KEY:
+        return None
+    import httpx
+    from groq import Groq
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    return Groq(api_key=GROQ_KEY, http_client=httpx.Client(http2=http2, timeout=60))
+
+@st.cache_resource(show_spinner=False)
+def get_fernet():
+    if not FERNET_KEY:
+        return None
+    from cryptography.fernet import Fernet
+    return Fernet(FERNET_KEY.encode())
 
-groq_client = Groq(api_key=GROQ_KEY) if GROQ_KEY else None
-fernet = Fernet(FERNET_KEY.encode()) if FERNET_KEY else None
-
-# Ensure database folder
-db_dir = os.path.dirname(DB_PATH)
-if db_dir and not os.path.exists(db_dir):
-    os.makedirs(db_dir, exist_ok=True)
-
-# DB setup (UTF-8 enforced)
-conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
-conn.text_factory = lambda b: b.decode(errors='ignore')
-c = conn.cursor()
-c.execute("""CREATE TABLE IF NOT EXISTS streaks (date TEXT PRIMARY KEY, count INTEGER)""")
-c.execute("""CREATE TABLE IF NOT EXISTS entries (
-    id INTEGER PRIMARY KEY,
-    date TEXT,
-    transcription TEXT,
-    emotion TEXT,
-    summary TEXT,
-    reflection TEXT
-)""")
-conn.commit()
+# Pooled keep-alive session for Deepgram: later entries skip the TCP/TLS handshake.
+# Cached as a resource because Streamlit re-executes this script on every rerun.
+@st.cache_resource(show_spinner=False)
+def get_dg_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4, pool_maxsize=4,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                          allowed_methods=frozenset({"POST"})),
+    ))
+    return session
+
+# DB setup (UTF-8 enforced). One connection per server process: Streamlit reruns
+# the script on every widget event, and reopening would redo the schema setup.
+# The connection is shared across sessions and the Groq worker threads, so
+# every access goes through db_lock.
+@st.cache_resource(show_spinner=False)
+def get_conn():
+    db_dir = os.path.dirname(DB_PATH)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    conn.text_factory = lambda b: b.decode(errors='ignore')
+    # WAL lets Past Entries read while a save is writing; NORMAL sync is durable in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("""CREATE TABLE IF NOT EXISTS streaks (date TEXT PRIMARY KEY, count INTEGER)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY,
+        date TEXT,
+        transcription TEXT,
+        emotion TEXT,
+        summary TEXT,
+        reflection TEXT
+    )""")
+    # Encrypted entries keep transcription/summary/reflection in one Fernet payload
+    if "payload" not in {row[1] for row in conn.execute("PRAGMA table_info(entries)")}:
+        conn.execute("ALTER TABLE entries ADD COLUMN payload BLOB")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_entries_date ON entries(date DESC)""")
+    # Full-text index over plaintext summaries for keyword search (encrypted rows have none)
+    try:
+        has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name='entries_fts'").fetchone()
+        conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts
+            USING fts5(summary, content='entries', content_rowid='id')""")
+        conn.execute("""CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+            INSERT INTO entries_fts(rowid, summary) VALUES (new.id, new.summary);
+        END""")
+        conn.execute("""CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+            INSERT INTO entries_fts(entries_fts, rowid, summary) VALUES ('delete', old.id, old.summary);
+        END""")
+        conn.execute("""CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE ON entries BEGIN
+            INSERT INTO entries_fts(entries_fts, rowid, summary) VALUES ('delete', old.id, old.summary);
+            INSERT INTO entries_fts(rowid, summary) VALUES (new.id, new.summary);
+        END""")
+        if not has_fts:
+            conn.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        logger.info(f"FTS5 search index disabled: {e}")
+    conn.execute("""CREATE TABLE IF NOT EXISTS groq_cache (
+        prompt_hash TEXT PRIMARY KEY,
+        model TEXT,
+        response TEXT,
+        created_at INTEGER
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS entry_cache (
+        id INTEGER PRIMARY KEY,
+        embedding BLOB,
+        emotion TEXT,
+        summary TEXT,
+        reflection TEXT,
+        created_at INTEGER
+    )""")
+    if not CACHE_LLM_OUTPUTS:
+        # Drop plaintext rows cached before encryption was enabled
+        conn.execute("DELETE FROM groq_cache")
+        conn.execute("DELETE FROM entry_cache")
+    conn.commit()
+    return conn
+
+@st.cache_resource(show_spinner=False)
+def get_db_lock():
+    return threading.Lock()
+
+conn = get_conn()
+db_lock = get_db_lock()
 
 # ==============================
 # Config + Style
 # ==============================
 st.set_page_config(page_title="Unposted Journal", page_icon="📝", layout="wide")
-st.markdown("""
+
+@st.cache_resource
+def page_style():
+    """Global CSS, built once per server process and re-emitted on each rerun."""
+    return """
 <style>
 header, #MainMenu, footer {visibility:hidden;}
 .block-container {max-width: 980px; padding-top:1.5rem;}
@@ -57,69 +183,256 @@ div.stButton > button {border-radius:8px; background:#111827; color:#ffffff; fon
 div.stButton > button:hover {background:#374151;}
 section[data-testid="stSidebar"] {background:#f9fafb; border-right:1px solid #e5e7eb;}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(page_style(), unsafe_allow_html=True)
 
 # ==============================
 # Navigation
 # ==============================
-try:
-    from streamlit_option_menu import option_menu
-except Exception:
-    option_menu = None
-
 NAV_OPTIONS = ["Journal", "Past Entries", "Streak Tracker"]
 with st.sidebar:
-    page = option_menu(
-        menu_title="",
-        options=NAV_OPTIONS,
-        icons=["mic-fill", "book", "fire"],
-        default_index=0,
-        orientation="vertical",
-        styles={
-            "icon": {"color": "#6b7280", "font-size": "18px"},
-            "nav-link": {"font-size": "14px", "color": "#111827", "--hover-color": "#f3f4f6"},
-            "nav-link-selected": {"background-color": "#e5e7eb", "font-weight": "600"},
-        },
-    )
+    # Imported here: only the sidebar needs it
+    try:
+        from streamlit_option_menu import option_menu
+    except Exception:
+        option_menu = None
+
+    if option_menu is None:
+        page = st.radio("Navigate", NAV_OPTIONS)
+    else:
+        page = option_menu(
+            menu_title="",
+            options=NAV_OPTIONS,
+            icons=["mic-fill", "book", "fire"],
+            default_index=0,
+            orientation="vertical",
+            styles={
+                "icon": {"color": "#6b7280", "font-size": "18px"},
+                "nav-link": {"font-size": "14px", "color": "#111827", "--hover-color": "#f3f4f6"},
+                "nav-link-selected": {"background-color": "#e5e7eb", "font-weight": "600"},
+            },
+        )
 
 # ==============================
 # Helpers
 # ==============================
+EMO_KEYWORDS = {
+    "Happy": ["happy", "joy", "excited", "good", "great", "love"],
+    "Sad": ["sad", "down", "lonely", "upset"],
+    "Angry": ["angry", "mad", "furious"],
+    "Stressed": ["stressed", "anxious", "tense"],
+    "Calm": ["calm", "peaceful", "relaxed"],
+}
+EMO_LABELS = list(EMO_KEYWORDS)
+
+# Lookup tables for sanitize_emotion_label, built once instead of per call
+_EMO_BY_LOWER = {l.lower(): l for l in EMO_LABELS}
+# Deletes every ASCII character except a-z (str.translate beats re.sub on short tokens)
+_KEEP_LOWER = str.maketrans("", "", "".join(chr(i) for i in range(128) if not "a" <= chr(i) <= "z"))
+
+def sanitize_emotion_label(raw):
+    """Map a one-word emotion answer ("Stressed.", "**calm**") to one of EMO_LABELS.
+
+    Only the first token is checked: SYS_EMOTION asks for a single word, and
+    scanning the whole answer would read "not sad, happy" as Sad. Returns None
+    otherwise, so callers can use the keyword fallback.
+    """
+    parts = str(raw or "").split(maxsplit=1)
+    tok = parts[0].lower().translate(_KEEP_LOWER) if parts else ""
+    return _EMO_BY_LOWER.get(tok)
+
+def _build_emotion_automaton():
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for label, words in EMO_KEYWORDS.items():
+        for w in words:
+            automaton.add_word(w, (label, w))
+    automaton.make_automaton()
+    return automaton
+
+def _build_emotion_hyperscan():
+    """Compile all keywords into one Hyperscan database; returns (db, id -> label) or None."""
+    if hyperscan is None:
+        return None
+    try:
+        patterns = [(w, label) for label, words in EMO_KEYWORDS.items() for w in words]
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[re.escape(w).encode() for w, _ in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[hyperscan.HS_FLAG_CASELESS] * len(patterns),
+        )
+        return db, [label for _, label in patterns]
+    except Exception as e:
+        logger.warning(f"Hyperscan unavailable: {e}")
+        return None
+
+# Built once per script run, since Streamlit re-executes the module on every rerun.
+# Preference order: Hyperscan DFA, Aho-Corasick, Numba, str.count.
+EMO_HYPERSCAN = _build_emotion_hyperscan()
+EMO_AUTOMATON = _build_emotion_automaton() if EMO_HYPERSCAN is None else None
+
+def _keyword_scores(hay, kw_bytes, kw_offsets, kw_labels, n_labels):
+    """Count non-overlapping keyword hits per label with Boyer-Moore-Horspool.
+
+    Keywords are packed into one uint8 buffer: keyword k spans
+    kw_bytes[kw_offsets[k]:kw_offsets[k + 1]] and scores for kw_labels[k].
+    """
+    scores = np.zeros(n_labels, dtype=np.int64)
+    skip = np.empty(256, dtype=np.int64)
+    n = hay.shape[0]
+    for k in range(kw_labels.shape[0]):
+        start = kw_offsets[k]
+        m = kw_offsets[k + 1] - start
+        if m == 0 or m > n:
+            continue
+        for b in range(256):
+            skip[b] = m
+        for j in range(m - 1):
+            skip[kw_bytes[start + j]] = m - 1 - j
+        i = 0
+        while i <= n - m:
+            j = m - 1
+            while j >= 0 and hay[i + j] == kw_bytes[start + j]:
+                j -= 1
+            if j < 0:
+                scores[kw_labels[k]] += 1
+                i += m  # non-overlapping, same as str.count
+            else:
+                i += skip[hay[i + m - 1]]
+    return scores
+
+def _build_keyword_tables():
+    words = [(EMO_LABELS.index(label), w.encode()) for label, ws in EMO_KEYWORDS.items() for w in ws]
+    offsets = np.cumsum([0] + [len(w) for _, w in words]).astype(np.int64)
+    packed = np.frombuffer(b"".join(w for _, w in words), dtype=np.uint8)
+    labels = np.array([i for i, _ in words], dtype=np.int64)
+    return packed, offsets, labels
+
+def _build_keyword_scores_jit():
+    """JIT-compile _keyword_scores with Numba; None when Numba is not installed."""
+    try:
+        from numba import njit
+    except Exception:
+        return None
+    return njit(cache=True)(_keyword_scores)
+
+# Numba path for when neither Hyperscan nor pyahocorasick is available; numba is
+# only imported in that case. A plain Python byte loop would be slower than
+# str.count, so without Numba the fallback keeps using str.count.
+EMO_KEYWORD_TABLES = _build_keyword_tables()
+keyword_scores_jit = _build_keyword_scores_jit() if EMO_HYPERSCAN is None and EMO_AUTOMATON is None else None
+
 def is_unavailable(s):
     return (not s) or str(s).strip().lower() in {"", "unavailable", "error"}
 
-def simple_emotion_fallback(text):
-    EMO_KEYWORDS = {
-        "Happy": ["happy", "joy", "excited", "good", "great", "love"],
-        "Sad": ["sad", "down", "lonely", "upset"],
-        "Angry": ["angry", "mad", "furious"],
-        "Stressed": ["stressed", "anxious", "tense"],
-        "Calm": ["calm", "peaceful", "relaxed"],
-    }
+def emotion_keyword_scores(text):
+    """Keyword hit count per label in EMO_LABELS, using the fastest available matcher."""
     t = text.lower()
-    scores = {k: sum(t.count(w) for w in v) for k, v in EMO_KEYWORDS.items()}
+    if EMO_HYPERSCAN is not None:
+        db, id_to_label = EMO_HYPERSCAN
+        scores = dict.fromkeys(EMO_LABELS, 0)
+
+        def on_match(pattern_id, start, end, flags, context):
+            scores[id_to_label[pattern_id]] += 1
+
+        # Scratch space is per scan: a shared one raises ScratchInUseError when
+        # two sessions scan at once
+        db.scan(t.encode(), match_event_handler=on_match, scratch=hyperscan.Scratch(db))
+    elif EMO_AUTOMATON is not None:
+        # Single pass over the transcript for all keywords
+        scores = dict.fromkeys(EMO_LABELS, 0)
+        for _, (label, _kw) in EMO_AUTOMATON.iter(t):
+            scores[label] += 1
+    elif keyword_scores_jit is not None:
+        hay = np.frombuffer(t.encode(), dtype=np.uint8)
+        counts = keyword_scores_jit(hay, *EMO_KEYWORD_TABLES, len(EMO_LABELS))
+        scores = dict(zip(EMO_LABELS, counts.tolist()))
+    else:
+        scores = {k: sum(t.count(w) for w in v) for k, v in EMO_KEYWORDS.items()}
+    return scores
+
+def simple_emotion_fallback(text):
+    scores = emotion_keyword_scores(text)
     if not any(scores.values()):
         return "Calm"
     # item-based max to satisfy static analyzers
     return max(scores.items(), key=lambda kv: kv[1])[0]
 
-def groq_generate(prompt, model="llama3-8b-8192"):
-    if not groq_client:
+# Fixed system instructions: identical across calls so the prompt prefix is cacheable
+# (provider prefix caching, proxies) and only the transcript varies in the user turn.
+SYS_EMOTION = "Identify the main emotion (Happy, Sad, Angry, Calm, Stressed) of the user's journal entry. Answer with that single word."
+SYS_SUMMARY = "Summarize the user's journal entry in 2 concise sentences."
+SYS_REFLECT = "Write 3 insightful bullet reflections based on the user's journal entry."
+SYS_FUSED = (
+    "Return a JSON object for the user's journal entry with keys \"emotion\" (one of Happy, Sad, Angry, Calm, Stressed), "
+    "\"summary\" (2 concise sentences) and \"reflection\" (3 insightful bullet reflections as a single string, "
+    "one '- ' bullet per line)."
+)
+
+def _groq_cache_key(prompt, model, system):
+    return hashlib.sha256((model + "\x00" + system + "\x00" + prompt).encode()).hexdigest()
+
+def groq_cache_get(prompt, model, system=""):
+    """Return a cached Groq response younger than GROQ_CACHE_TTL, or None."""
+    key = _groq_cache_key(prompt, model, system)
+    with db_lock:
+        row = conn.execute(
+            "SELECT response FROM groq_cache WHERE prompt_hash=? AND created_at > ?",
+            (key, int(time.time()) - GROQ_CACHE_TTL),
+        ).fetchone()
+    return row[0] if row else None
+
+def groq_cache_put(prompt, model, response, system=""):
+    key = _groq_cache_key(prompt, model, system)
+    with db_lock:
+        conn.execute(
+            "INSERT OR REPLACE INTO groq_cache (prompt_hash, model, response, created_at) VALUES (?, ?, ?, ?)",
+            (key, model, response, int(time.time())),
+        )
+        conn.execute("DELETE FROM groq_cache WHERE created_at < ?", (int(time.time()) - GROQ_CACHE_TTL,))
+        conn.commit()
+
+def groq_complete(prompt, model=GROQ_MODEL, system=None, max_tokens=600, response_format=None):
+    """One chat completion, served from the local response cache when possible.
+
+    Returns (text, from_cache) and never stores the reply; API errors propagate.
+    """
+    if CACHE_LLM_OUTPUTS:
+        cached = groq_cache_get(prompt, model, system or "")
+        if cached is not None:
+            return cached, True
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    extra = {"response_format": response_format} if response_format else {}
+    res = get_groq_client().chat.completions.create(
+        model=model, messages=messages,
+        temperature=0.7, max_tokens=max_tokens, **extra
+    )
+    return res.choices[0].message.content.strip(), False
+
+def groq_generate(prompt, model=GROQ_MODEL, system=None, max_tokens=600, response_format=None):
+    if not get_groq_client():
         return "Unavailable"
     try:
-        res = groq_client.chat.completions.create(
-            model=model, messages=[{"role": "user", "content": prompt}],
-            temperature=0.7, max_tokens=600
-        )
-        return res.choices[0].message.content.strip()
+        text, from_cache = groq_complete(prompt, model, system, max_tokens, response_format)
+        # Only fresh replies are stored, so a hit never extends the row's TTL
+        if not from_cache and CACHE_LLM_OUTPUTS and not is_unavailable(text):
+            groq_cache_put(prompt, model, text, system or "")
+        return text
     except Exception as e:
         logger.error(f"Groq error: {e}")
         return "Unavailable"
 
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
 def summary_fallback(text: str) -> str:
     """Very small offline summarizer: first 1-2 sentences or first 300 chars."""
-    import re as _re
-    sents = [_s.strip() for _s in _re.split(r"(?<=[.!?])\s+", text.strip()) if _s.strip()]
+    # Only the first two sentences are used, so stop splitting after them
+    sents = [_s.strip() for _s in _SENT_SPLIT.split(text.strip(), maxsplit=2)[:2] if _s.strip()]
     if not sents:
         return text[:300]
     if len(sents) == 1:
@@ -136,31 +449,222 @@ def reflections_fallback(text: str, emotion: str) -> str:
     ]
     return "\n".join(lines)
 
-def process_text(transcription):
-    """Handles emotion detection, summarization, and reflection (English only)."""
-    # Emotion detection
-    emo_prompt = f"Identify the main emotion (Happy, Sad, Angry, Calm, Stressed) from this journal entry:\n\n{transcription}"
-    emotion = groq_generate(emo_prompt)
+def transcribe_audio(audio_bytes, content_type):
+    """Send audio to Deepgram (English only) and return the transcript text."""
+    headers = {"Authorization": f"Token {DEEPGRAM_KEY}", "Content-Type": content_type}
+    params = {
+        "model": "nova-2-general",
+        "smart_format": "true",
+        "language": "en"  # Force English
+    }
+    res = get_dg_session().post(
+        "https://api.deepgram.com/v1/listen",
+        headers=headers,
+        params=params,
+        data=audio_bytes,
+        timeout=(5, 60)
+    )
+    dg = orjson.loads(res.content) if orjson is not None else json.loads(res.content)
+    try:
+        return dg["results"]["channels"][0]["alternatives"][0]["transcript"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+@st.cache_resource(show_spinner=False)
+def get_embedder():
+    """Load the sentence embedding model once; None disables the semantic cache."""
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception as e:
+        logger.info(f"Semantic cache disabled: {e}")
+        return None
+
+def embed_text(text):
+    """Unit-normalized float32 embedding of text, or None when no embedder is available."""
+    model = get_embedder()
+    if model is None:
+        return None
+    try:
+        return np.asarray(model.encode(text, normalize_embeddings=True), dtype=np.float32)
+    except Exception as e:
+        logger.error(f"Embedding error: {e}")
+        return None
+
+def semantic_cache_lookup(vec):
+    """Return stored outputs for the most similar recent entry above the threshold, or None."""
+    with db_lock:
+        rows = conn.execute(
+            "SELECT embedding, emotion, summary, reflection FROM entry_cache WHERE created_at > ?",
+            (int(time.time()) - SEMANTIC_CACHE_TTL,),
+        ).fetchall()
+    rows = [r for r in rows if r[0] is not None and len(r[0]) == vec.nbytes]
+    if not rows:
+        return None
+    matrix = np.frombuffer(b"".join(r[0] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+    scores = matrix @ vec
+    best = int(np.argmax(scores))
+    if scores[best] < SEMANTIC_CACHE_THRESHOLD:
+        return None
+    _, emotion, summary, reflection = rows[best]
+    return {"emotion": emotion, "summary": summary, "reflection": reflection}
+
+def semantic_cache_store(vec, outputs):
+    with db_lock:
+        conn.execute(
+            "INSERT INTO entry_cache (embedding, emotion, summary, reflection, created_at) VALUES (?, ?, ?, ?, ?)",
+            (vec.tobytes(), outputs["emotion"], outputs["summary"], outputs["reflection"], int(time.time())),
+        )
+        conn.execute("DELETE FROM entry_cache WHERE created_at < ?", (int(time.time()) - SEMANTIC_CACHE_TTL,))
+        conn.commit()
+
+def parse_fused_response(raw):
+    """Extract (emotion, summary, reflection) from the fused JSON reply; None if malformed."""
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    reflection = data.get("reflection")
+    if isinstance(reflection, list):
+        reflection = "\n".join(f"- {str(r).lstrip('-• ').strip()}" for r in reflection)
+    parts = (data.get("emotion"), data.get("summary"), reflection)
+    if any(not isinstance(x, str) or is_unavailable(x) for x in parts):
+        return None
+    return parts
+
+def generate_separately(transcription):
+    """One Groq call per output, run concurrently; used when the fused reply is unusable."""
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        emo_future = pool.submit(groq_generate, transcription, system=SYS_EMOTION)
+        summary_future = pool.submit(groq_generate, transcription, system=SYS_SUMMARY)
+        reflection_future = pool.submit(groq_generate, transcription, system=SYS_REFLECT)
+        return emo_future.result(), summary_future.result(), reflection_future.result()
+
+def generate_outputs(transcription):
+    """Runs emotion detection, summarization, and reflection through Groq (English only).
+
+    A single JSON-mode call covers all three outputs, so the transcript is sent
+    and prefilled once. If Groq rejects that call (JSON mode reports a failed
+    generation as HTTP 400) or the reply lacks a field, the separate calls run
+    instead; only an unreachable Groq goes straight to the offline fallbacks.
+    """
+    raw, from_cache, rejected = "Unavailable", False, False
+    if get_groq_client():
+        try:
+            raw, from_cache = groq_complete(transcription, system=SYS_FUSED, max_tokens=900,
+                                            response_format={"type": "json_object"})
+        except Exception as e:
+            from groq import APIConnectionError
+            if isinstance(e, APIConnectionError):
+                logger.error(f"Groq unreachable: {e}")
+            else:
+                logger.warning(f"Fused Groq call rejected ({e}); using separate calls")
+                rejected = True
+    if rejected:
+        emotion, summary, reflection = generate_separately(transcription)
+    elif is_unavailable(raw):
+        emotion = summary = reflection = "Unavailable"
+    else:
+        parsed = parse_fused_response(raw)
+        if parsed is None:
+            logger.warning("Fused Groq reply was not a JSON object with all fields; using separate calls")
+            emotion, summary, reflection = generate_separately(transcription)
+        else:
+            emotion, summary, reflection = parsed
+            # Stored only once parsed, so a malformed reply is retried next time
+            if CACHE_LLM_OUTPUTS and not from_cache:
+                groq_cache_put(transcription, GROQ_MODEL, raw, SYS_FUSED)
+    if not is_unavailable(emotion):
+        emotion = sanitize_emotion_label(emotion) or "Unavailable"
+
+    complete = not any(is_unavailable(x) for x in (emotion, summary, reflection))
+
+    # Fallbacks (emotion first, the reflection template depends on it)
     if is_unavailable(emotion):
         emotion = simple_emotion_fallback(transcription)
-
-    # Summary
-    summary_prompt = f"Summarize this in 2 concise sentences:\n\n{transcription}"
-    summary = groq_generate(summary_prompt)
     if is_unavailable(summary):
         summary = summary_fallback(transcription)
-
-    # Reflections
-    reflections_prompt = f"Write 3 insightful bullet reflections based on this entry:\n\n{transcription}"
-    reflection = groq_generate(reflections_prompt)
     if is_unavailable(reflection):
         reflection = reflections_fallback(transcription, emotion)
 
-    return {
+    outputs = {
         "emotion": emotion.strip(),
         "summary": summary.strip(),
         "reflection": reflection.strip()
     }
+    return outputs, complete
+
+def emotion_agrees(text, emotion):
+    """False when the transcript's keywords clearly point to another emotion."""
+    scores = emotion_keyword_scores(text)
+    top = max(scores.values())
+    return top == 0 or scores.get(emotion, 0) == top
+
+def process_text(transcription):
+    """Returns emotion, summary, and reflection, reusing results for near-duplicate entries."""
+    vec = embed_text(transcription) if GROQ_KEY and CACHE_LLM_OUTPUTS else None
+    if vec is not None:
+        cached = semantic_cache_lookup(vec)
+        # Paraphrases can flip sentiment ("happy" vs "sad" in the same context) and
+        # still embed close together, so a hit must agree with the local keywords.
+        if cached is not None and emotion_agrees(transcription, cached["emotion"]):
+            # The summary is saved as this entry's record, so it must describe this
+            # transcript rather than the neighbour it matched; the emotion and the
+            # reflection prompts are what the cache saves a Groq call for.
+            return {**cached, "summary": summary_fallback(transcription)}
+
+    outputs, complete = generate_outputs(transcription)
+    # Only genuine Groq outputs are reused; heuristic fallbacks are cheap to recompute.
+    if vec is not None and complete:
+        semantic_cache_store(vec, outputs)
+    return outputs
+
+def encrypt_entry(d):
+    """Encrypt the sensitive fields of an entry as a single Fernet token.
+
+    One token over the compact JSON means one AES-CBC pass and one HMAC for
+    the whole entry instead of one per field.
+    """
+    return get_fernet().encrypt(json.dumps(d, separators=(",", ":")).encode())
+
+def decrypt_entry(payload):
+    """Inverse of encrypt_entry; None when no key is configured or the key does not match."""
+    fernet = get_fernet()
+    if fernet is None:
+        return None
+    from cryptography.fernet import InvalidToken
+    try:
+        return json.loads(fernet.decrypt(bytes(payload)))
+    except (InvalidToken, ValueError):
+        logger.error("Could not decrypt entry (wrong FERNET_KEY?)")
+        return None
+
+def db_mtime():
+    """Last write time of the database (WAL included); part of the query cache keys."""
+    paths = (DB_PATH, DB_PATH + "-wal")
+    return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0.0)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_recent_entries(db_version, limit=10):
+    with db_lock:
+        rows = conn.execute("SELECT date, emotion, summary, payload FROM entries ORDER BY date DESC LIMIT ?", (limit,)).fetchall()
+    entries = []
+    for date, emotion, summary, payload in rows:
+        if payload is not None:
+            data = decrypt_entry(payload)
+            summary = data.get("summary", "") if data else "🔒 Encrypted entry (FERNET_KEY missing or changed)."
+        entries.append((date, emotion, summary))
+    return entries
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_streaks(db_version, limit=30):
+    """Returns (total journal days, latest streak rows)."""
+    with db_lock:
+        total = conn.execute("SELECT COUNT(*) FROM streaks").fetchone()[0]
+        rows = conn.execute("SELECT date, count FROM streaks ORDER BY date DESC LIMIT ?", (limit,)).fetchall()
+    return total, rows
 
 # ==============================
 # JOURNAL PAGE
@@ -172,7 +676,12 @@ if page == "Journal":
     starter = st.selectbox("Pick a conversation starter:", ["Person", "Event", "Incident", "Life Situation", "Other"])
 
     if hasattr(st, "audio_input"):
-        audio_data = st.audio_input("🎙️ Record your journal (~60–90s):")
+        try:
+            # 16 kHz mono WAV is what Deepgram works at; recording at that rate
+            # keeps the upload small without any re-encoding on our side
+            audio_data = st.audio_input("🎙️ Record your journal (~60–90s):", sample_rate=16000)
+        except TypeError:  # older Streamlit versions have no sample_rate option
+            audio_data = st.audio_input("🎙️ Record your journal (~60–90s):")
     else:
         st.warning("⚠️ Your Streamlit version doesn’t support st.audio_input. Upgrade to >=1.30.")
         audio_data = None
@@ -185,40 +694,39 @@ if page == "Journal":
                     st.error("Missing DEEPGRAM_API_KEY.")
                     transcription = ""
                 else:
-                    headers = {"Authorization": f"Token {DEEPGRAM_KEY}", "Content-Type": audio_data.type}
-                    params = {
-                        "model": "nova-2-general",
-                        "smart_format": "true",
-                        "language": "en"  # Force English
-                    }
-                    res = requests.post(
-                        "https://api.deepgram.com/v1/listen",
-                        headers=headers,
-                        params=params,
-                        data=audio_data.getvalue()
-                    )
-                    transcription = res.json().get("results", {}).get("channels", [{}])[0].get("alternatives", [{}])[0].get("transcript", "")
+                    transcription = transcribe_audio(audio_data.getvalue(), audio_data.type)
 
                 if not transcription:
                     st.warning("No speech detected.")
                 else:
                     # Show transcript first
-                    st.markdown("<div class='uj-card'><h2>Transcript</h2><pre style='white-space:pre-wrap; font-size:.9rem; line-height:1.3;'>{}</pre></div>".format(transcription.replace('<','&lt;').replace('>','&gt;')), unsafe_allow_html=True)
+                    st.markdown("<div class='uj-card'><h2>Transcript</h2><pre style='white-space:pre-wrap; font-size:.9rem; line-height:1.3;'>{}</pre></div>".format(html.escape(transcription)), unsafe_allow_html=True)
 
                     outputs = process_text(transcription)
 
-                    st.markdown(f"<div class='uj-card'><h2>Emotion</h2><p><strong>{outputs['emotion']}</strong></p></div>", unsafe_allow_html=True)
-                    st.markdown(f"<div class='uj-card'><h2>Summary</h2><p>{outputs['summary']}</p></div>", unsafe_allow_html=True)
-                    st.markdown(f"<div class='uj-card'><h2>Reflections</h2><pre style='white-space:pre-wrap; font-size:.9rem; line-height:1.35;'>{outputs['reflection']}</pre></div>", unsafe_allow_html=True)
+                    st.markdown(
+                        f"<div class='uj-card'><h2>Emotion</h2><p><strong>{html.escape(outputs['emotion'])}</strong></p></div>"
+                        f"<div class='uj-card'><h2>Summary</h2><p>{html.escape(outputs['summary'])}</p></div>"
+                        f"<div class='uj-card'><h2>Reflections</h2><pre style='white-space:pre-wrap; font-size:.9rem; line-height:1.35;'>{html.escape(outputs['reflection'])}</pre></div>",
+                        unsafe_allow_html=True,
+                    )
 
                     st.download_button("⬇️ Export Reflections", outputs['reflection'], file_name="reflection_english.txt")
 
                     today = datetime.now().strftime("%Y-%m-%d")
-                    c.execute("INSERT INTO entries (date, transcription, emotion, summary, reflection) VALUES (?, ?, ?, ?, ?)",
-                              (today, transcription, outputs['emotion'], outputs['summary'], outputs['reflection']))
-                    c.execute("INSERT OR REPLACE INTO streaks VALUES (?, COALESCE((SELECT count+1 FROM streaks WHERE date=?), 1))",
-                              (today, today))
-                    conn.commit()
+                    # Entry + streak in one transaction: a single commit per save
+                    with db_lock, conn:
+                        if FERNET_KEY:
+                            payload = encrypt_entry({"transcription": transcription, "summary": outputs['summary'], "reflection": outputs['reflection']})
+                            conn.execute("INSERT INTO entries (date, emotion, payload) VALUES (?, ?, ?)",
+                                         (today, outputs['emotion'], payload))
+                        else:
+                            conn.execute("INSERT INTO entries (date, transcription, emotion, summary, reflection) VALUES (?, ?, ?, ?, ?)",
+                                         (today, transcription, outputs['emotion'], outputs['summary'], outputs['reflection']))
+                        conn.execute("INSERT INTO streaks (date, count) VALUES (?, 1) ON CONFLICT(date) DO UPDATE SET count = count + 1",
+                                     (today,))
+                    load_recent_entries.clear()
+                    load_streaks.clear()
                     st.success("✅ Saved privately.")
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -228,23 +736,24 @@ if page == "Journal":
 # ==============================
 elif page == "Past Entries":
     st.markdown("<h1>Past Journal Entries</h1>", unsafe_allow_html=True)
-    c.execute("SELECT date, emotion, summary FROM entries ORDER BY date DESC LIMIT 10")
-    entries = c.fetchall()
+    entries = load_recent_entries(db_mtime(), limit=200)
     if not entries:
         st.info("No entries yet.")
-    for date, emotion, summary in entries:
-        st.markdown(f"<div class='uj-card'><h2>{date} – {emotion}</h2><p>{summary}</p></div>", unsafe_allow_html=True)
+    else:
+        # Columnar table: Arrow payload and virtualized scrolling instead of per-entry cards
+        import pandas as pd  # only this page needs it
+        df = pd.DataFrame(entries, columns=["Date", "Emotion", "Summary"])
+        st.dataframe(df, width="stretch", hide_index=True)
 
 # ==============================
 # STREAK TRACKER PAGE
 # ==============================
 elif page == "Streak Tracker":
     st.markdown("<h1>Streak Tracker</h1>", unsafe_allow_html=True)
-    c.execute("SELECT COUNT(*) FROM streaks")
-    total = c.fetchone()[0]
+    total, streak_rows = load_streaks(db_mtime())
     st.metric("Total Journal Days", total)
-    c.execute("SELECT date, count FROM streaks ORDER BY date DESC LIMIT 30")
-    for d, c_ in c.fetchall():
-        st.markdown(f"<div class='uj-card'><p><strong>{d}</strong> — {c_} entry</p></div>", unsafe_allow_html=True)
-
-conn.close()
+    if streak_rows:
+        st.markdown("".join(
+            f"<div class='uj-card'><p><strong>{html.escape(str(d))}</strong> — {c_} entry</p></div>"
+            for d, c_ in streak_rows
+        ), unsafe_allow_html=True)
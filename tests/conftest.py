@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# app opens its database at import, so point it away from the repo root first
+os.environ["LOCAL_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="journal_tests_"), "journal_data.db")
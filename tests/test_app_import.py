@@ -1,8 +1,266 @@
 import importlib
 
+import pytest
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """The app module bound to a fresh SQLite database."""
+    mod = importlib.import_module('app')
+    monkeypatch.setattr(mod, 'DB_PATH', str(tmp_path / 'journal_test.db'))
+    mod.get_conn.clear()
+    monkeypatch.setattr(mod, 'conn', mod.get_conn())
+    yield mod
+    mod.conn.close()
+    mod.get_conn.clear()
+    mod.load_recent_entries.clear()
+
 def test_app_imports():
     mod = importlib.import_module('app')
     # Verify key symbols exist
     assert hasattr(mod, 'EMO_LABELS')
     assert isinstance(mod.EMO_LABELS, list)
     assert 'Calm' in mod.EMO_LABELS
+
+@pytest.fixture(params=["hyperscan", "ahocorasick", "numba", "str.count"])
+def emotion_backend(request, monkeypatch):
+    """The app module with exactly one keyword-matching backend enabled."""
+    mod = importlib.import_module('app')
+    backends = {
+        "hyperscan": ("EMO_HYPERSCAN", mod._build_emotion_hyperscan),
+        "ahocorasick": ("EMO_AUTOMATON", mod._build_emotion_automaton),
+        "numba": ("keyword_scores_jit", mod._build_keyword_scores_jit),
+    }
+    for attr, _ in backends.values():
+        monkeypatch.setattr(mod, attr, None)
+    if request.param in backends:
+        attr, build = backends[request.param]
+        built = build()
+        if built is None:
+            pytest.skip(f"{request.param} is not installed")
+        monkeypatch.setattr(mod, attr, built)
+    return mod
+
+def test_simple_emotion_fallback(emotion_backend):
+    mod = emotion_backend
+    assert mod.simple_emotion_fallback("I was sad, lonely and upset, but happy later") == 'Sad'
+    assert mod.simple_emotion_fallback("nothing to report") == 'Calm'
+
+def test_summary_fallback():
+    mod = importlib.import_module('app')
+    assert mod.summary_fallback("One. Two! Three? Four.") == "One. Two!"
+    assert mod.summary_fallback("  Just one sentence  ") == "Just one sentence"
+    assert mod.summary_fallback("") == ""
+
+def test_sanitize_emotion_label():
+    mod = importlib.import_module('app')
+    assert mod.sanitize_emotion_label("Stressed.") == 'Stressed'
+    assert mod.sanitize_emotion_label("**calm**, mostly") == 'Calm'
+    assert mod.sanitize_emotion_label("I'm not sad, I'm happy") is None
+    assert mod.sanitize_emotion_label("Unclear") is None
+    assert mod.sanitize_emotion_label("") is None
+
+def test_encrypted_entry_round_trip(app_db, monkeypatch):
+    from cryptography.fernet import Fernet
+    fernet = Fernet(Fernet.generate_key())
+    monkeypatch.setattr(app_db, 'get_fernet', lambda: fernet)
+    entry = {"transcription": "t", "summary": "Quiet walk.", "reflection": "- rest"}
+    payload = app_db.encrypt_entry(entry)
+    assert b"Quiet walk" not in payload
+    assert app_db.decrypt_entry(payload) == entry
+
+    app_db.conn.execute("INSERT INTO entries (date, emotion, payload) VALUES (?, ?, ?)", ("2026-01-01", "Calm", payload))
+    assert app_db.load_recent_entries(1) == [("2026-01-01", "Calm", "Quiet walk.")]
+
+    # A different key cannot read the row
+    monkeypatch.setattr(app_db, 'get_fernet', lambda: Fernet(Fernet.generate_key()))
+    assert app_db.decrypt_entry(payload) is None
+    app_db.load_recent_entries.clear()
+    assert app_db.load_recent_entries(2)[0][2].startswith("🔒")
+
+class FakeGroq:
+    """Stands in for the Groq client; records every completion request.
+
+    An exception as reply is raised by the JSON-mode call only; plain calls answer "Calm".
+    """
+
+    def __init__(self, reply="Calm"):
+        self.reply = reply
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if isinstance(self.reply, Exception):
+            if kwargs.get("response_format"):
+                raise self.reply
+            return self._response("Calm")
+        return self._response(self.reply)
+
+    def _response(self, reply):
+        message = type("Message", (), {"content": reply})
+        choice = type("Choice", (), {"message": message})
+        return type("Response", (), {"choices": [choice]})
+
+def test_llm_caches_off_with_encryption(app_db, monkeypatch):
+    client = FakeGroq()
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    monkeypatch.setattr(app_db, 'CACHE_LLM_OUTPUTS', False)
+    app_db.groq_generate("entry", system="sys")
+    app_db.groq_generate("entry", system="sys")
+    assert len(client.calls) == 2
+    assert app_db.conn.execute("SELECT COUNT(*) FROM groq_cache").fetchone()[0] == 0
+
+def test_parse_fused_response():
+    mod = importlib.import_module('app')
+    assert mod.parse_fused_response('{"emotion": "Sad", "summary": "A. B.", "reflection": ["- x", "y"]}') == ('Sad', 'A. B.', '- x\n- y')
+    assert mod.parse_fused_response('{"emotion": "Sad", "summary": "A.", "reflection": "- x"}') == ('Sad', 'A.', '- x')
+    assert mod.parse_fused_response('not json') is None
+    assert mod.parse_fused_response('[1, 2]') is None
+    assert mod.parse_fused_response('{"emotion": "Sad", "summary": "A."}') is None
+
+def test_malformed_fused_reply_is_not_cached(app_db, monkeypatch):
+    client = FakeGroq(reply="not json")
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    monkeypatch.setattr(app_db, 'CACHE_LLM_OUTPUTS', True)
+    app_db.generate_outputs("I went for a walk.")
+    # One fused call plus three separate calls
+    assert len(client.calls) == 4
+    assert app_db.groq_cache_get("I went for a walk.", app_db.GROQ_MODEL, app_db.SYS_FUSED) is None
+
+    client.reply = '{"emotion": "Calm", "summary": "A walk.", "reflection": "- Rest."}'
+    outputs, complete = app_db.generate_outputs("I went for a walk.")
+    assert complete and outputs["emotion"] == "Calm"
+    assert app_db.groq_cache_get("I went for a walk.", app_db.GROQ_MODEL, app_db.SYS_FUSED) == client.reply
+
+KEYWORD_SAMPLES = [
+    "",
+    "sad",
+    "I was sad sad SAD and so lonely, downloading a calm playlist",
+    "good great love joy happy excited goodgood",
+    "mad madness furious anxious tense stressed peaceful relaxed upset",
+]
+
+@pytest.mark.parametrize("text", KEYWORD_SAMPLES)
+def test_emotion_keyword_scores_match_str_count(emotion_backend, text):
+    mod = emotion_backend
+    t = text.lower()
+    expected = {label: sum(t.count(w) for w in words) for label, words in mod.EMO_KEYWORDS.items()}
+    assert mod.emotion_keyword_scores(text) == expected
+
+class StubEmbedder:
+    """Maps every text to the same unit vector, so every lookup is a near-duplicate."""
+
+    def encode(self, text, normalize_embeddings=True):
+        return [0.5, 0.5, 0.5, 0.5]
+
+@pytest.fixture
+def semantic_app(app_db, monkeypatch):
+    monkeypatch.setattr(app_db, 'get_embedder', lambda: StubEmbedder())
+    monkeypatch.setattr(app_db, 'GROQ_KEY', 'test')
+    monkeypatch.setattr(app_db, 'CACHE_LLM_OUTPUTS', True)
+    client = FakeGroq(reply='{"emotion": "Happy", "summary": "A good day.", "reflection": "- Enjoy it."}')
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    app_db.fake_client = client
+    return app_db
+
+def test_semantic_cache_hit(semantic_app):
+    first = semantic_app.process_text("Today was a happy day at the park.")
+    assert first["emotion"] == "Happy"
+    second = semantic_app.process_text("I had a happy afternoon in the park.")
+    assert second["emotion"] == first["emotion"] and second["reflection"] == first["reflection"]
+    assert second["summary"] == "I had a happy afternoon in the park."
+    assert len(semantic_app.fake_client.calls) == 1
+
+def test_semantic_cache_rejects_flipped_emotion(semantic_app):
+    semantic_app.process_text("Today was a happy day at the park.")
+    semantic_app.fake_client.reply = '{"emotion": "Sad", "summary": "A sad day.", "reflection": "- Be kind."}'
+    second = semantic_app.process_text("Today was a sad day at the park.")
+    assert second["emotion"] == "Sad"
+    assert len(semantic_app.fake_client.calls) == 2
+
+def test_expired_cache_rows_are_pruned(semantic_app):
+    import numpy as np
+    semantic_app.conn.execute("INSERT INTO entry_cache (embedding, emotion, summary, reflection, created_at) VALUES (?, 'Calm', 's', 'r', 0)",
+                              (np.ones(4, dtype=np.float32).tobytes(),))
+    semantic_app.conn.execute("INSERT INTO groq_cache (prompt_hash, model, response, created_at) VALUES ('old', 'm', 'r', 0)")
+    semantic_app.process_text("Today was a happy day at the park.")
+    assert semantic_app.conn.execute("SELECT COUNT(*) FROM entry_cache WHERE created_at = 0").fetchone()[0] == 0
+    assert semantic_app.conn.execute("SELECT COUNT(*) FROM groq_cache WHERE created_at = 0").fetchone()[0] == 0
+
+def test_fts_index_follows_entries(app_db):
+    def search(term):
+        return [r[0] for r in app_db.conn.execute("SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?", (term,))]
+
+    app_db.conn.execute("INSERT INTO entries (id, date, emotion, summary) VALUES (1, '2026-01-01', 'Calm', 'a walk by the river')")
+    assert search("river") == [1]
+    app_db.conn.execute("UPDATE entries SET summary = 'a swim in the lake' WHERE id = 1")
+    assert search("river") == [] and search("lake") == [1]
+    app_db.conn.execute("DELETE FROM entries WHERE id = 1")
+    assert search("lake") == []
+
+def test_groq_cache_hit_and_ttl(app_db, monkeypatch):
+    client = FakeGroq(reply="Calm")
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    monkeypatch.setattr(app_db, 'CACHE_LLM_OUTPUTS', True)
+    assert app_db.groq_generate("entry", system="sys") == "Calm"
+    assert app_db.groq_generate("entry", system="sys") == "Calm"
+    assert len(client.calls) == 1
+
+    # A different system prompt is a different cache key
+    app_db.groq_generate("entry", system="other")
+    assert len(client.calls) == 2
+
+    # Rows older than the TTL are ignored
+    app_db.conn.execute("UPDATE groq_cache SET created_at = created_at - ?", (app_db.GROQ_CACHE_TTL + 1,))
+    app_db.groq_generate("entry", system="sys")
+    assert len(client.calls) == 3
+
+    # Unavailable replies are never cached
+    client.reply = "Unavailable"
+    app_db.groq_generate("new entry")
+    app_db.groq_generate("new entry")
+    assert len(client.calls) == 5
+
+def test_fused_cache_hit_keeps_created_at(app_db, monkeypatch):
+    client = FakeGroq(reply='{"emotion": "Calm", "summary": "A walk.", "reflection": "- Rest."}')
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    monkeypatch.setattr(app_db, 'CACHE_LLM_OUTPUTS', True)
+    app_db.generate_outputs("I went for a walk.")
+    app_db.conn.execute("UPDATE groq_cache SET created_at = created_at - 80000")
+    aged = app_db.conn.execute("SELECT created_at FROM groq_cache").fetchone()[0]
+
+    outputs, complete = app_db.generate_outputs("I went for a walk.")
+    assert complete and outputs["summary"] == "A walk."
+    assert len(client.calls) == 1
+    assert app_db.conn.execute("SELECT created_at FROM groq_cache").fetchone()[0] == aged
+
+def _groq_request():
+    import httpx
+    return httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+def test_rejected_fused_call_uses_separate_calls(app_db, monkeypatch):
+    import groq
+    import httpx
+    error = groq.BadRequestError("json_validate_failed", response=httpx.Response(400, request=_groq_request()), body=None)
+    client = FakeGroq(reply=error)
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    outputs, complete = app_db.generate_outputs("I went for a walk.")
+    # One rejected fused call plus three separate calls
+    assert len(client.calls) == 4
+    assert complete and outputs["emotion"] == "Calm"
+
+def test_unreachable_groq_skips_separate_calls(app_db, monkeypatch):
+    import groq
+    client = FakeGroq(reply=groq.APIConnectionError(request=_groq_request()))
+    monkeypatch.setattr(app_db, 'get_groq_client', lambda: client)
+    outputs, complete = app_db.generate_outputs("I went for a walk.")
+    assert len(client.calls) == 1
+    assert not complete
+
+def test_semantic_hit_summarizes_the_new_transcript(semantic_app):
+    semantic_app.process_text("Met Priya for lunch downtown. We talked about her new job.")
+    second = semantic_app.process_text("Had lunch with Omar in the city. He talked about moving.")
+    assert len(semantic_app.fake_client.calls) == 1
+    assert "Omar" in second["summary"] and "Priya" not in second["summary"]